@@ -3,4 +3,7 @@ PUSH_SERVICE_PORT = 5
 
 TIMEOUT = 2
 
+# how often push thread checks if it should stop
+PUSH_POLL_INTERVAL = 0.5
+
 BUFFER_SIZE = 8192
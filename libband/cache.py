@@ -0,0 +1,53 @@
+import json
+import os
+
+CACHE_DIR = os.path.join(
+    os.getenv('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+    'libmsftband'
+)
+
+
+class DeviceCache:
+    """
+    Persistent per-device metadata store, kept as a JSON file named after
+    the device address in CACHE_DIR
+    """
+    path = None
+    data = None
+
+    def __init__(self, address, directory=None):
+        directory = directory or CACHE_DIR
+        self.path = os.path.join(
+            directory, '%s.json' % address.replace(':', ''))
+        self.data = self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'w') as cache_file:
+                json.dump(self.data, cache_file)
+        except OSError:
+            # cache is only an optimization, device works without it
+            pass
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value):
+        self.data[key] = value
+        self.save()
+
+    def delete(self, key):
+        if self.data.pop(key, None) is not None:
+            self.save()
+
+    def clear(self):
+        self.data = {}
+        self.save()
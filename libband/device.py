@@ -2,8 +2,11 @@ from __future__ import print_function
 from enum import IntEnum
 import struct
 import binascii
+import socket
 import uuid
 import threading
+from dataclasses import asdict
+from types import MappingProxyType
 
 from .notifications import GenericClearTileNotification
 from .parser import MsftBandParser
@@ -17,13 +20,35 @@ from .commands import (
     NAVIGATE_TO_SCREEN, GET_ME_TILE_IMAGE_ID,
     GET_TILES, SET_TILES,
 )
-from .versions import BandType, DeviceVersion, FirmwareVersion
+from .versions import (
+    BandType, DeviceVersion, FirmwareVersion, FIRMWARE_VERSION
+)
 from .socket import BandSocket
+from .cache import DeviceCache
 from .sensors import decode_sensor_reading
-from . import PUSH_SERVICE_PORT
+from . import PUSH_SERVICE_PORT, PUSH_POLL_INTERVAL
+
+UINT8 = struct.Struct("B")
+UINT16 = struct.Struct("H")
+UINT32 = struct.Struct("I")
+UINT32_LE = struct.Struct("<I")
+
+# guid, order, theme color, name length, settings mask, name + padding
+TILE_RECORD = struct.Struct("<16sIIHH52s8x")
+TILE_HEADER = struct.Struct("<16sIIHH")
+
+# DeviceVersion fields by firmware app name
+FIRMWARE_SLOTS = {
+    '1BL': 'bootloader',
+    '2UP': 'updater',
+    'App': 'application',
+}
 
 
 class DummyWrapper:
+    debug = False
+    verbose = False
+
     def print(self, *args, **kwargs):
         print(*args, **kwargs)
 
@@ -64,6 +89,24 @@ class PushServicePacketType(IntEnum):
     KeyboardSetContent = 222
 
 
+def serialize_tile(tile):
+    icon = tile.get('icon')
+    return dict(
+        tile,
+        guid=str(tile['guid']),
+        icon=binascii.hexlify(icon).decode() if icon else None
+    )
+
+
+def deserialize_tile(tile):
+    icon = tile.get('icon')
+    return dict(
+        tile,
+        guid=uuid.UUID(tile['guid']),
+        icon=binascii.unhexlify(icon) if icon else None
+    )
+
+
 class BandDevice:
     address = ""
     cargo = None
@@ -72,17 +115,82 @@ class BandDevice:
     band_language = None
     band_name = None
     serial_number = None
+    api_version = None
     push_thread = None
-    services = {}
-    version: DeviceVersion
+    cache = None
+    version: DeviceVersion = None
     wrapper = DummyWrapper()
 
     def __init__(self, address):
         self.address = address
         self.push = BandSocket(self, PUSH_SERVICE_PORT)
         self.cargo = BandSocket(self)
+        self._services = {}
+        self._services_by_guid = {}
+        self._me_tile_cache = {}
+        self._push_stop = threading.Event()
+        self._push_dispatch = {
+            PushServicePacketType.RemoteSubscription: self.process_sensor,
+            PushServicePacketType.Sms: self.process_notification_callback,
+            PushServicePacketType.DismissCall:
+                self.process_notification_callback,
+            PushServicePacketType.StrappEvent: self.process_strapp_event,
+        }
+        self.load_cache()
         self.wrapper.atexit(self.disconnect)
 
+    def load_cache(self):
+        """
+        Loads device metadata persisted by previous connections, so it
+        doesn't have to be requested from the device again
+        """
+        self.cache = DeviceCache(self.address)
+        self.serial_number = self.cache.get('serial_number')
+        self.api_version = self.cache.get('api_version')
+        self._oobe_completed = self.cache.get('oobe_completed')
+        version = self.cache.get('version')
+        self.version = DeviceVersion.from_dict(version) if version else None
+
+    def validate_cache(self):
+        """
+        Re-reads firmware versions and drops cached device metadata if
+        application firmware differs from the cached one (e.g. Band was
+        updated from another device)
+        """
+        cached_version = self.version
+        version = self.get_firmware_version(force=True)
+        if not cached_version or \
+                cached_version.application != version.application:
+            self.cache.clear()
+            self.load_cache()
+            self.tiles = None
+            self.version = version
+            self.cache.set('version', asdict(version))
+
+    @property
+    def services(self):
+        """
+        Read-only view of registered services, use add_service or assign
+        a new dict to register them
+        """
+        return MappingProxyType(self._services)
+
+    @services.setter
+    def services(self, services):
+        self._services = {}
+        self._services_by_guid = {}
+        for name, service in services.items():
+            self.add_service(name, service)
+
+    def add_service(self, name, service):
+        """
+        Registers service under given name and indexes it by its guid,
+        so push packets can be routed to it
+        """
+        self._services[name] = service
+        if service.guid:
+            self._services_by_guid.setdefault(service.guid, service)
+
     @property
     def band_type(self):
         if self.version:
@@ -93,22 +201,40 @@ class BandDevice:
         self.cargo.connect()
 
         # fetch device data
-        self.get_firmware_version()
+        self.validate_cache()
 
         # start push thread
-        self.push_thread = threading.Thread(target=self.listen_pushservice)
+        self._push_stop.clear()
+        self.push_thread = threading.Thread(
+            target=self.listen_pushservice, daemon=True)
         self.push_thread.start()
 
     def disconnect(self):
+        self._push_stop.set()
         self.push.disconnect()
         self.cargo.disconnect()
+        if self.push_thread and \
+                self.push_thread is not threading.current_thread():
+            self.push_thread.join(PUSH_POLL_INTERVAL * 2)
+
+    def check_if_oobe_completed(self, force=False):
+        """
+        Checks if OOBE was completed. Once it is, it stays completed until
+        factory reset, so positive result is cached unless force is set
+        """
+        if self._oobe_completed and not force:
+            return True
 
-    def check_if_oobe_completed(self):
         result, data = self.cargo.cargo_read(
             CARGO_SYSTEM_SETTINGS_OOBE_COMPLETED_GET, 4)
+        self._oobe_completed = False
         if data:
-            return struct.unpack("<I", data[0])[0] != 0
-        return False
+            self._oobe_completed = UINT32_LE.unpack_from(data[0])[0] != 0
+        if self._oobe_completed:
+            self.cache.set('oobe_completed', True)
+        else:
+            self.cache.delete('oobe_completed')
+        return self._oobe_completed
 
     def get_me_tile_image_id(self):
         result, data = self.cargo.cargo_read(GET_ME_TILE_IMAGE_ID, 4)
@@ -119,8 +245,13 @@ class BandDevice:
     def get_me_tile_image(self):
         """
         Sends READ_ME_TILE_IMAGE command to device and returns a bgr565
-        byte array with Me tile image
+        byte array with Me tile image. Image is cached by its id, so it's
+        transferred only when it changes
         """
+        image_id = self.get_me_tile_image_id()
+        if image_id in self._me_tile_cache:
+            return self._me_tile_cache[image_id]
+
         # calculate byte count based on device type
         if self.band_type == BandType.Cargo:
             byte_count = 310 * 102 * 2
@@ -130,15 +261,20 @@ class BandDevice:
             byte_count = 0
 
         # read Me Tile image
-        result, data = self.cargo.cargo_read(READ_ME_TILE_IMAGE, byte_count)
-        pixel_data = b''.join(data)
+        result, pixel_data = self.cargo.cargo_read_contiguous(
+            READ_ME_TILE_IMAGE, byte_count)
+        pixel_data = bytes(pixel_data)
+        if image_id and result and byte_count and \
+                len(pixel_data) == byte_count:
+            self._me_tile_cache[image_id] = pixel_data
         return pixel_data
 
     def set_me_tile_image(self, pixel_data, image_id):
+        image_id = struct.pack("<I", image_id)
         result, data = self.cargo.cargo_write_with_data(
-            WRITE_ME_TILE_IMAGE_WITH_ID,
-            pixel_data,
-            struct.pack("<I", image_id))
+            WRITE_ME_TILE_IMAGE_WITH_ID, pixel_data, image_id)
+        if result:
+            self._me_tile_cache = {image_id: bytes(pixel_data)}
         return result, data
 
     def navigate_to_screen(self, screen):
@@ -150,16 +286,13 @@ class BandDevice:
             NAVIGATE_TO_SCREEN, struct.pack("<H", screen))
 
     def process_push(self, guid, command, message):
-        for service in self.services.values():
-            if service.guid == guid:
-                new_message = service.push(guid, command, message)
-                if new_message:
-                    message = new_message
-                    break
+        service = self._services_by_guid.get(guid)
+        if service:
+            return service.push(guid, command, message) or message
         return message
 
     def process_tile_callback(self, result):
-        opcode = struct.unpack("I", result[6:10])[0]
+        opcode = UINT32.unpack_from(result, 6)[0]
         guid = uuid.UUID(bytes_le=result[10:26])
         command = result[26:44]
         tile_name = MsftBandParser.bytes_to_text(result[44:84])
@@ -167,49 +300,66 @@ class BandDevice:
         message = {
             "opcode": opcode,
             "guid": str(guid),
-            "command": binascii.hexlify(command),
+            "command": command,
             "tile_name": tile_name,
         }
         message = self.process_push(guid, command, message)
         self.wrapper.send("PushService", message)
 
     def process_notification_callback(self, result):
-        opcode = struct.unpack("I", result[2:6])[0]
+        opcode = UINT32.unpack_from(result, 2)[0]
         guid = uuid.UUID(bytes_le=result[6:22])
         command = result[22:]
 
         message = {
             "opcode": opcode,
             "guid": str(guid),
-            "command": str(binascii.hexlify(command)),
+            "command": command,
         }
 
         message = self.process_push(guid, command, message)
         self.wrapper.send("PushService", message)
 
+    def process_sensor(self, result):
+        sensor = decode_sensor_reading(result)
+        self.wrapper.print(sensor)
+
+    def process_strapp_event(self, result):
+        if getattr(self.wrapper, 'verbose', False):
+            self.wrapper.print(binascii.hexlify(result))
+        self.process_tile_callback(result)
+
+    def process_unknown_packet(self, result):
+        if getattr(self.wrapper, 'verbose', False):
+            self.wrapper.print(binascii.hexlify(result))
+
     def listen_pushservice(self):
+        if self._push_stop.is_set():
+            return
         self.push.connect()
-        while True:
+        self.push.settimeout(PUSH_POLL_INTERVAL)
+        while not self._push_stop.is_set():
             try:
                 result = self.push.receive()
+            except socket.timeout:
+                continue
             except OSError:
                 break
 
-            packet_type = struct.unpack("H", result[0:2])[0]
-            self.wrapper.print(PushServicePacketType(packet_type))
-
-            if packet_type == PushServicePacketType.RemoteSubscription:
-                sensor = decode_sensor_reading(result)
-                self.wrapper.print(sensor)
-            elif packet_type == PushServicePacketType.Sms:
-                self.process_notification_callback(result)
-            elif packet_type == PushServicePacketType.DismissCall:
-                self.process_notification_callback(result)
-            elif packet_type == PushServicePacketType.StrappEvent:
-                self.wrapper.print(binascii.hexlify(result))
-                self.process_tile_callback(result)
-            else:
-                self.wrapper.print(binascii.hexlify(result))
+            packet_type = UINT16.unpack_from(result)[0]
+            if getattr(self.wrapper, 'debug', False):
+                try:
+                    self.wrapper.print(PushServicePacketType(packet_type))
+                except ValueError:
+                    self.wrapper.print(packet_type)
+
+            handler = self._push_dispatch.get(
+                packet_type, self.process_unknown_packet)
+            handler(result)
+
+        # disconnect may have run before push socket was connected
+        if self._push_stop.is_set() and not self.push.closed:
+            self.push.disconnect()
 
     def sync(self):
         for service in self.services.values():
@@ -224,6 +374,9 @@ class BandDevice:
 
     def clear_tile(self, guid):
         self.send_notification(GenericClearTileNotification(guid))
+        # fetch tiles again next time
+        self.tiles = None
+        self.cache.delete('tiles')
 
     def set_theme(self, colors):
         """
@@ -237,16 +390,35 @@ class BandDevice:
         self.cargo.cargo_write(START_STRIP_SYNC_END)
 
     def get_tiles(self):
+        if not self.tiles:
+            self.tiles = self.load_cached_tiles()
         if not self.tiles:
             self.request_tiles()
         return self.tiles
 
+    def load_cached_tiles(self):
+        """
+        Returns tiles cached for currently installed firmware, if any
+        """
+        cached = self.cache.get('tiles')
+        firmware = str(self.get_firmware_version().application)
+        if not cached or cached['firmware'] != firmware:
+            return None
+        return [deserialize_tile(tile) for tile in cached['tiles']]
+
+    def save_cached_tiles(self):
+        self.cache.set('tiles', {
+            'firmware': str(self.get_firmware_version().application),
+            'tiles': [serialize_tile(tile) for tile in self.tiles],
+        })
+
     def get_serial_number(self):
         if not self.serial_number:
             # ask nicely for serial number
             result, number = self.cargo.cargo_read(SERIAL_NUMBER_REQUEST, 12)
             if result:
                 self.serial_number = number[0].decode("utf-8")
+                self.cache.set('serial_number', self.serial_number)
         return self.serial_number
 
     def get_max_tile_capacity(self):
@@ -255,28 +427,29 @@ class BandDevice:
 
     def set_tiles(self):
         self.cargo.cargo_write(START_STRIP_SYNC_START)
-        # icons = []
-        tiles = []
-
-        data = bytes([])
-        for x in self.tiles:
-            # icons.append(x['icon'])
-            tile = bytes([])
-            tile += x['guid'].bytes_le
-            tile += struct.pack("<I", x['order'])
-            tile += struct.pack("<I", x['theme_color'])
-            tile += struct.pack("<H", len(x['name']))
-            tile += struct.pack("<H", x['settings_mask'])
-            tile += MsftBandParser.serialize_text(x['name'], 30)
-            tiles.append(tile)
-        # data = b''.join(icons)
-        data += struct.pack("<I", len(tiles))
-        data += b''.join(tiles)
+        tile_count = len(self.tiles)
+
+        # first 4 bytes are tile count, followed by tile records
+        data = bytearray(4 + TILE_RECORD.size * tile_count)
+        UINT32_LE.pack_into(data, 0, tile_count)
+        for i, x in enumerate(self.tiles):
+            offset = 4 + TILE_RECORD.size * i
+            TILE_HEADER.pack_into(
+                data, offset, x['guid'].bytes_le, x['order'],
+                x['theme_color'], len(x['name']), x['settings_mask']
+            )
+            offset += TILE_HEADER.size
+            data[offset:offset + 60] = MsftBandParser.serialize_text(
+                x['name'], 30)[:60]
 
         result = self.cargo.cargo_write_with_data(
-            SET_TILES, data, struct.pack("<I", len(tiles))
+            SET_TILES, bytes(data), UINT32_LE.pack(tile_count)
         )
         self.cargo.cargo_write(START_STRIP_SYNC_END)
+        if result[0]:
+            self.save_cached_tiles()
+        else:
+            self.cache.delete('tiles')
         return result
 
     def request_tiles(self, icons=False):
@@ -288,85 +461,69 @@ class BandDevice:
             response_size += max_tiles * 1024
             command = GET_TILES
 
-        result, tiles = self.cargo.cargo_read(
+        result, tile_data = self.cargo.cargo_read_contiguous(
             command, response_size)
-        tile_data = b"".join(tiles)
+        # slices of memoryview don't copy the response
+        tile_data = memoryview(tile_data)
 
         tile_list = []
-        tile_icons = []
 
-        begin = 0
-
-        if icons:
-            for i in range(0, max_tiles):
-                tile_icons.append(tile_data[begin:begin+1024])
-                begin += 1024
+        # icons for all slots go first
+        begin = max_tiles * 1024 if icons else 0
 
         # first 4 bytes are tile count
-        tile_count = struct.unpack("<I", tile_data[begin:begin+4])[0]
+        tile_count = UINT32_LE.unpack_from(tile_data, begin)[0]
         begin += 4
-        i = 0
-
-        # while there are tiles
-        while i < tile_count:
-            # get guuid
-            guid = uuid.UUID(bytes_le=tile_data[begin:begin+16])
-            order = struct.unpack("<I", tile_data[begin+16:begin+20])[0]
-            theme_color = struct.unpack("<I", tile_data[begin+20:begin+24])[0]
-            name_length = struct.unpack("<H", tile_data[begin+24:begin+26])[0]
-            settings_mask = struct.unpack(
-                "<H", tile_data[begin+26:begin+28]
-            )[0]
-
-            # get tile name
-            if name_length:
-                name = MsftBandParser.bytes_to_text(
-                    tile_data[begin+28:begin+80])
-            else:
-                name = ''
-
-            # append tile to list
+        records = TILE_RECORD.iter_unpack(
+            tile_data[begin:begin + TILE_RECORD.size * tile_count])
+
+        for i, (
+            guid, order, theme_color, name_length, settings_mask, name
+        ) in enumerate(records):
             tile_list.append({
-                "guid": guid,
+                "guid": uuid.UUID(bytes_le=guid),
                 "order": order,
                 "theme_color": theme_color,
                 "name_length": name_length,
                 "settings_mask": settings_mask,
-                "name": name,
-                "icon": tile_icons[i] if icons else None
+                "name": MsftBandParser.bytes_to_text(name)
+                if name_length else '',
+                "icon": bytes(tile_data[i*1024:(i+1)*1024]) if icons else None
             })
-
-            # move to next tile
-            begin += 88
-            i += 1
         self.tiles = tile_list
+        if result:
+            self.save_cached_tiles()
 
     def send_notification(self, notification):
         self.cargo.cargo_write_with_data(
             CARGO_NOTIFICATION, notification.serialize()
         )
 
-    def get_firmware_version(self):
-        result, info = self.cargo.cargo_read(CORE_GET_VERSION, 19*3)
-        info = b''.join(info)
+    def get_firmware_version(self, force=False):
+        if self.version and not force:
+            return self.version
+
+        result, info = self.cargo.cargo_read_contiguous(
+            CORE_GET_VERSION, FIRMWARE_VERSION.size * 3)
         self.version = DeviceVersion()
 
-        offset = 0
         for i in range(0, 3):
-            fw_version = FirmwareVersion.deserialize(info[offset:offset+19])
-            if fw_version.app_name == '1BL':
-                self.version.bootloader = fw_version
-            elif fw_version.app_name == '2UP':
-                self.version.updater = fw_version
-            elif fw_version.app_name == 'App':
-                self.version.application = fw_version
-            offset += 19
+            fw_version = FirmwareVersion.deserialize(
+                info, FIRMWARE_VERSION.size * i)
+            slot = FIRMWARE_SLOTS.get(fw_version.app_name)
+            if slot:
+                setattr(self.version, slot, fw_version)
+        version = asdict(self.version)
+        if self.cache.get('version') != version:
+            self.cache.set('version', version)
         return self.version
 
     def get_api_version(self):
-        result, info = self.cargo.cargo_read(CORE_GET_API_VERSION, 4)
-        version = struct.unpack('I', info[0])[0]
-        return version
+        if self.api_version is None:
+            result, info = self.cargo.cargo_read(CORE_GET_API_VERSION, 4)
+            self.api_version = UINT32.unpack_from(info[0])[0]
+            self.cache.set('api_version', self.api_version)
+        return self.api_version
 
     def get_running_firmware_app(self):
         """
@@ -377,7 +534,7 @@ class BandDevice:
         - UpApp - Probably also Updater (?)
         """
         result, info = self.cargo.cargo_read(CORE_WHO_AM_I, 1)
-        app = struct.unpack('B', info[0])[0]
+        app = UINT8.unpack_from(info[0])[0]
         return FirmwareApp(app)
 
     def check_firmware_sdk_bit(self, platform, reserved):
@@ -1,46 +1,105 @@
 import bluetooth
-import time
+import socket
+import threading
 import struct
 from libband.status import decode_status
 from . import CARGO_SERVICE_PORT, TIMEOUT, BUFFER_SIZE
 
 
+class ResponseBuffer:
+    """
+    Preallocated buffer response chunks are copied into as they arrive,
+    used by send_for_result in place of a list of chunks
+    """
+    def __init__(self, size):
+        self.data = bytearray(size)
+        self.view = memoryview(self.data)
+        self.length = 0
+
+    def append(self, chunk):
+        # drop anything past expected response size
+        chunk = chunk[:len(self.data) - self.length]
+        self.view[self.length:self.length + len(chunk)] = chunk
+        self.length += len(chunk)
+
+    def release(self):
+        """
+        Returns received data as bytearray trimmed to received length
+        """
+        self.view.release()
+        del self.data[self.length:]
+        return self.data
+
+
 class BandSocket:
     device = None
     socket = None
     port = CARGO_SERVICE_PORT
     max_reconnects = 5
     reconnect_count = 0
+    timeout = None
 
     def __init__(self, device=None, port=CARGO_SERVICE_PORT):
         self.device = device
         self.port = port
         self.socket = self._make_socket()
+        self._closed = threading.Event()
+
+    @property
+    def closed(self):
+        """
+        True once disconnect was called, until connect is called again
+        """
+        return self._closed.is_set()
 
     def _make_socket(self):
         return bluetooth.BluetoothSocket(bluetooth.RFCOMM)
 
     def connect(self, timeout=TIMEOUT):
+        self._closed.clear()
+        self.open(timeout)
+
+    def open(self, timeout=TIMEOUT):
         self.reconnect_count = 0
         self.device.wrapper.send("Status", [self.port, "Connecting"])
-        while True:
+        while not self.closed:
             try:
                 self.socket.close()
                 self.socket = self._make_socket()
                 self.socket.connect((self.device.address, self.port))
+                if self.closed:
+                    # disconnected while connecting
+                    self.socket.close()
+                    break
+                if self.timeout is not None:
+                    self.socket.settimeout(self.timeout)
                 break
             except bluetooth.btcommon.BluetoothError as error:
                 self.socket.close()
                 self.device.wrapper.print("Could not connect: %s" % error)
-                time.sleep(timeout)
+                # wait before next attempt, unless disconnected meanwhile
+                self._closed.wait(timeout)
                 self.reconnect_count += 1
             if self.reconnect_count > self.max_reconnects:
                 self.device.wrapper.send("Status", [self.port, "Disconnected"])
                 return
+        if self.closed:
+            return
         self.reconnect_count = 0
         self.device.wrapper.send("Status", [self.port, "Connected"])
 
+    def reconnect(self, error):
+        """
+        Reconnects after connection was lost, unless socket was closed
+        with disconnect, then raises OSError instead
+        """
+        if self.closed:
+            raise OSError(error)
+        self.device.wrapper.print("Connecting because %s" % error)
+        self.open()
+
     def disconnect(self):
+        self._closed.set()
         try:
             self.socket.close()
         except Exception as exc:
@@ -49,14 +108,24 @@ class BandSocket:
         self.reconnect_count = 0
         self.device.wrapper.send("Status", "Disconnected")
 
+    def settimeout(self, timeout):
+        """
+        Sets receive timeout kept across reconnects, receive raises
+        socket.timeout when it runs out
+        """
+        self.timeout = timeout
+        self.socket.settimeout(timeout)
+
     def receive(self, buffer_size=BUFFER_SIZE):
         while True:
             try:
                 result = self.socket.recv(buffer_size)
                 break
             except bluetooth.btcommon.BluetoothError as error:
-                self.device.wrapper.print("Connecting because %s" % error)
-                self.connect()
+                # pybluez wraps socket timeouts in BluetoothError
+                if self.timeout is not None and str(error) == "timed out":
+                    raise socket.timeout(error)
+                self.reconnect(error)
         return result
 
     def send(self, packet):
@@ -66,15 +135,18 @@ class BandSocket:
                 self.socket.send(packet)
                 break
             except bluetooth.btcommon.BluetoothError as error:
-                self.device.wrapper.print("Connecting because %s" % error)
-                self.connect()
+                self.reconnect(error)
             except OSError as error:
                 # I guess we lost connection because of malformed packet
-                self.device.wrapper.print("Connecting because %s" % error)
-                self.connect()
-
-    def send_for_result(self, packet, buffer_size=BUFFER_SIZE):
-        results = []
+                self.reconnect(error)
+
+    def send_for_result(self, packet, buffer_size=BUFFER_SIZE, results=None):
+        """
+        Sends packet and collects response chunks until status is received,
+        chunks are appended to results (new list if none given)
+        """
+        if results is None:
+            results = []
         success = False
 
         # send packet
@@ -121,7 +193,8 @@ class BandSocket:
             result += arguments
         return result
 
-    def cargo_read(self, command, response_size, arguments=None):
+    def cargo_read(self, command, response_size, arguments=None,
+                   results=None):
         if not arguments:
             arguments = struct.pack("<I", response_size)
 
@@ -132,7 +205,17 @@ class BandSocket:
             arguments,
             True
         )
-        return self.send_for_result(command_packet)
+        return self.send_for_result(command_packet, results=results)
+
+    def cargo_read_contiguous(self, command, response_size, arguments=None):
+        """
+        Same as cargo_read, but received chunks are copied straight into
+        a preallocated buffer, returned as a new bytearray owned by caller
+        """
+        buffer = ResponseBuffer(response_size)
+        result, buffer = self.cargo_read(
+            command, response_size, arguments, results=buffer)
+        return result, buffer.release()
 
     def cargo_write(self, command, arguments=None):
         packet = self.make_command_packet(
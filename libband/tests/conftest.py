@@ -6,3 +6,12 @@ from libband.tests.utils import MockBandSocket
 def mock_band(mocker):
     mocker.patch('libband.device.BandSocket', MockBandSocket)
     mocker.patch('libband.socket.BandSocket', MockBandSocket)
+    # mocked sockets of devices that were never connected can't be
+    # disconnected at exit
+    mocker.patch('libband.device.DummyWrapper.atexit')
+
+
+@pytest.fixture(autouse=True)
+def device_cache(mocker, tmp_path):
+    mocker.patch('libband.cache.CACHE_DIR', str(tmp_path))
+    return tmp_path
@@ -1,7 +1,14 @@
+import struct
+import time
+import uuid
+
 import pytest
 
+from libband import PUSH_POLL_INTERVAL
+from libband.apps import CalendarService, WeatherService
 from libband.commands.facilities import Facility
 from libband.device import BandDevice
+from libband.parser import MsftBandParser
 from libband.screens import BandScreens
 from libband.versions import BandType, DeviceVersion, FirmwareVersion
 
@@ -42,17 +49,10 @@ def connected_cargo(cargo):
 
 
 def test_get_firmware_version(connected_cargo):
-    connected_cargo.cargo.call(
-        packet=b'\x0c\xf9.\x81v9\x00\x00\x009\x00\x00\x00',
-        results=[
-            b'1BL\x00\x00\t\n\x00\x02\x00\x00\x00\x00\x00~\t\x00\x00\x002UP'
-            b'\x00\x00\t\n\x00\x03\x00\x00\x00\x00\x00\xe8\x0c\x00\x00\x00'
-            b'App\x00\x00\t\n\x00\x03\x00\x00\x00\x00\x00\xe8\x0c\x00\x00\x00',
-            b'\xfe\xa6\x00\x00\x00\x00'
-        ]
-    )
-
+    # version was fetched on connect, so it's not requested again
+    packet_count = len(connected_cargo.cargo._received_packets)
     connected_cargo.get_firmware_version()
+    assert len(connected_cargo.cargo._received_packets) == packet_count
     assert connected_cargo.version == DeviceVersion(
         application=FirmwareVersion(
             app_name='App',
@@ -97,3 +97,194 @@ def test_navigate_to_screen(connected_cargo):
         []
     )
     assert expected_packet in connected_cargo.cargo._received_packets
+
+
+def test_version_cached_across_instances(connected_cargo):
+    device = BandDevice('ab:cd:ef:gh')
+    assert device.version == connected_cargo.version
+    assert device.band_type == BandType.Cargo
+
+
+def test_cache_kept_for_same_firmware(connected_cargo, mocker):
+    version_packet = b'\x0c\xf9.\x81v9\x00\x00\x009\x00\x00\x00'
+    connected_cargo.serial_number = 'SERIAL'
+    connected_cargo.cache.set('serial_number', 'SERIAL')
+    connected_cargo.cargo._expected_results[version_packet].clear()
+    connected_cargo.cargo.call(
+        packet=version_packet,
+        results=[
+            b'1BL\x00\x00\t\n\x00\x02\x00\x00\x00\x00\x00~\t\x00\x00\x002UP'
+            b'\x00\x00\t\n\x00\x03\x00\x00\x00\x00\x00\xe8\x0c\x00\x00\x00'
+            b'App\x00\x00\t\n\x00\x03\x00\x00\x00\x00\x00\xe8\x0c\x00\x00\x00',
+            b'\xfe\xa6\x00\x00\x00\x00'
+        ]
+    )
+    save = mocker.spy(connected_cargo.cache, 'save')
+    connected_cargo.validate_cache()
+    assert connected_cargo.serial_number == 'SERIAL'
+    save.assert_not_called()
+
+
+def test_cache_invalidated_on_firmware_version_change(connected_cargo):
+    version_packet = b'\x0c\xf9.\x81v9\x00\x00\x009\x00\x00\x00'
+    connected_cargo.serial_number = 'SERIAL'
+    connected_cargo.cache.set('serial_number', 'SERIAL')
+    # Band was updated to 10.3.3305.0 from another device
+    connected_cargo.cargo._expected_results[version_packet].clear()
+    connected_cargo.cargo.call(
+        packet=version_packet,
+        results=[
+            b'1BL\x00\x00\t\n\x00\x02\x00\x00\x00\x00\x00~\t\x00\x00\x002UP'
+            b'\x00\x00\t\n\x00\x03\x00\x00\x00\x00\x00\xe8\x0c\x00\x00\x00'
+            b'App\x00\x00\t\n\x00\x03\x00\x00\x00\x00\x00\xe9\x0c\x00\x00\x00',
+            b'\xfe\xa6\x00\x00\x00\x00'
+        ]
+    )
+    connected_cargo.validate_cache()
+    assert connected_cargo.version.application.build_number == 3305
+    assert connected_cargo.serial_number is None
+
+    device = BandDevice('ab:cd:ef:gh')
+    assert device.serial_number is None
+    assert device.version.application.build_number == 3305
+
+
+def test_get_me_tile_image_cached_by_id(connected_cargo):
+    read_image_packet = b'\x0c\xf9.\x8e\xc3\x08\xf7\x00\x00\x08\xf7\x00\x00'
+    pixel_data = b'\x1f\x00' * 310 * 102
+    for i in range(3):
+        # GET_ME_TILE_IMAGE_ID command
+        connected_cargo.cargo.call(
+            packet=b'\x0c\xf9.\x92\xca\x04\x00\x00\x00\x04\x00\x00\x00',
+            results=[
+                b'\x07\x00\x00\x00',
+                b'\xfe\xa6\x00\x00\x00\x00'
+            ]
+        )
+    # short transfer is not cached
+    connected_cargo.cargo.call(
+        packet=read_image_packet,
+        results=[pixel_data[:32], b'\xfe\xa6\x00\x00\x00\x00']
+    )
+    connected_cargo.cargo.call(
+        packet=read_image_packet,
+        results=[pixel_data, b'\xfe\xa6\x00\x00\x00\x00']
+    )
+
+    connected_cargo.cargo._received_packets.clear()
+    assert connected_cargo.get_me_tile_image() == pixel_data[:32]
+    image = connected_cargo.get_me_tile_image()
+    assert isinstance(image, bytes)
+    assert image == pixel_data
+    assert connected_cargo.get_me_tile_image() == pixel_data
+    assert connected_cargo.cargo._received_packets.count(
+        read_image_packet) == 2
+
+
+def test_tiles_cached_across_instances(connected_cargo):
+    tile_guid = uuid.UUID('fb9d005a-c2fc-4f2b-9a7c-4d3f5c9a0e6b')
+    tile = (
+        tile_guid.bytes_le + struct.pack('<IIHH', 0, 0xff3366cc, 3, 0) +
+        MsftBandParser.serialize_text('Run', 30)
+    )
+    # GET_TILES_NO_IMAGES command
+    connected_cargo.cargo.call(
+        packet=b'\x0c\xf9.\x92\xd4,\x05\x00\x00,\x05\x00\x00',
+        results=[
+            struct.pack('<I', 1) + tile + bytes(88 * 14),
+            b'\xfe\xa6\x00\x00\x00\x00'
+        ]
+    )
+    tiles = connected_cargo.get_tiles()
+    assert tiles[0]['guid'] == tile_guid
+    assert tiles[0]['name'] == 'Run'
+
+    device = BandDevice('ab:cd:ef:gh')
+    device.cargo._received_packets.clear()
+    assert device.get_tiles() == tiles
+    assert device.cargo._received_packets == []
+
+
+def test_check_if_oobe_completed_latches(connected_cargo):
+    oobe_packet = b'\x0c\xf9.\x93\xca\x04\x00\x00\x00\x04\x00\x00\x00'
+    connected_cargo.cargo._received_packets.clear()
+    assert connected_cargo.check_if_oobe_completed()
+    assert BandDevice('ab:cd:ef:gh').check_if_oobe_completed()
+    assert connected_cargo.cargo._received_packets.count(oobe_packet) == 1
+
+    # Band was factory reset
+    connected_cargo.cargo._expected_results[oobe_packet].clear()
+    connected_cargo.cargo.call(
+        packet=oobe_packet,
+        results=[b'\x00\x00\x00\x00', b'\xfe\xa6\x00\x00\x00\x00']
+    )
+    assert not connected_cargo.check_if_oobe_completed(force=True)
+
+
+def test_process_push_routes_by_guid(cargo, mocker):
+    calendar = CalendarService(cargo)
+    weather = WeatherService(cargo)
+    cargo.services = {'CalendarService': calendar}
+    cargo.add_service('WeatherService', weather)
+    mocker.patch.object(calendar, 'push', return_value={'routed': True})
+    mocker.patch.object(weather, 'push', return_value=False)
+
+    message = {}
+    assert cargo.process_push(calendar.guid, b'', message) == {
+        'routed': True
+    }
+    assert cargo.process_push(weather.guid, b'', message) is message
+    assert cargo.process_push(uuid.uuid4(), b'', message) is message
+
+
+def test_push_thread_stops_on_disconnect(connected_cargo):
+    # wait for push thread to connect and start polling
+    for i in range(100):
+        if connected_cargo.push.timeout:
+            break
+        time.sleep(0.01)
+    assert connected_cargo.push_thread.is_alive()
+    assert connected_cargo.push.timeout == PUSH_POLL_INTERVAL
+
+    connected_cargo.disconnect()
+    assert not connected_cargo.push_thread.is_alive()
+
+
+def test_services_not_shared_between_devices(cargo):
+    cargo.add_service('CalendarService', CalendarService(cargo))
+    device = BandDevice('cc:dd')
+    assert dict(device.services) == {}
+    assert device._services_by_guid == {}
+
+    with pytest.raises(TypeError):
+        cargo.services['WeatherService'] = WeatherService(cargo)
+
+
+def test_set_tiles_without_icons_refreshes_cache(connected_cargo):
+    tile = {
+        'guid': uuid.UUID('fb9d005a-c2fc-4f2b-9a7c-4d3f5c9a0e6b'),
+        'order': 0,
+        'theme_color': 0xff3366cc,
+        'name': 'Run',
+        'name_length': 3,
+        'settings_mask': 0,
+    }
+    connected_cargo.tiles = [tile]
+    for i in range(3):
+        connected_cargo.cargo.call(results=[b'\xfe\xa6\x00\x00\x00\x00'])
+    connected_cargo.set_tiles()
+
+    device = BandDevice('ab:cd:ef:gh')
+    assert device.get_tiles() == [dict(tile, icon=None)]
+
+
+def test_push_socket_closed_when_stopped_before_connecting(
+    connected_cargo, mocker
+):
+    connected_cargo.disconnect()
+    # disconnect runs while push thread is connecting
+    mocker.patch.object(
+        connected_cargo, '_push_stop', mocker.Mock(is_set=mocker.Mock(
+            side_effect=[False, True, True])))
+    connected_cargo.listen_pushservice()
+    assert connected_cargo.push.closed
@@ -0,0 +1,45 @@
+import socket
+
+import bluetooth
+import pytest
+
+from libband.socket import BandSocket, ResponseBuffer
+
+
+@pytest.fixture
+def band_socket(mocker):
+    mocker.patch.object(BandSocket, '_make_socket', return_value=mocker.Mock())
+    return BandSocket(mocker.Mock(address='ab:cd:ef:gh'))
+
+
+def test_receive_raises_timeout(band_socket, mocker):
+    band_socket.settimeout(0.5)
+    band_socket.socket.recv.side_effect = bluetooth.btcommon.BluetoothError(
+        'timed out')
+    reconnect = mocker.patch.object(band_socket, 'open')
+
+    with pytest.raises(socket.timeout):
+        band_socket.receive()
+    reconnect.assert_not_called()
+
+
+def test_receive_does_not_reconnect_after_disconnect(band_socket, mocker):
+    band_socket.disconnect()
+    band_socket.socket.recv.side_effect = bluetooth.btcommon.BluetoothError(
+        'Bad file descriptor')
+    reconnect = mocker.patch.object(band_socket, 'open')
+
+    with pytest.raises(OSError):
+        band_socket.receive()
+    reconnect.assert_not_called()
+
+
+def test_response_buffer():
+    buffer = ResponseBuffer(5)
+    buffer.append(b'abc')
+    buffer.append(b'defg')
+    assert buffer.release() == bytearray(b'abcde')
+
+    buffer = ResponseBuffer(10)
+    buffer.append(b'ab')
+    assert buffer.release() == bytearray(b'ab')
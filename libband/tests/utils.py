@@ -1,5 +1,7 @@
 from collections import defaultdict
+import socket
 import struct
+import time
 
 from libband import BUFFER_SIZE, TIMEOUT
 from libband.socket import BandSocket
@@ -26,6 +28,7 @@ class MockBandSocket(BandSocket):
 
         # simulate connection
         self.device.wrapper.send("Status", [self.port, "Connected"])
+        self._closed.clear()
         self._connected = True
 
     def disconnect(self):
@@ -34,32 +37,47 @@ class MockBandSocket(BandSocket):
 
         # simulate disconnection
         self.device.wrapper.send("Status", "Disconnected")
+        self._closed.set()
         self._connected = False
 
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def receive(self, buffer_size=BUFFER_SIZE):
+        # no push packets to simulate, time out until disconnected
+        if self.closed:
+            raise OSError
+        time.sleep(self.timeout or 0)
+        raise socket.timeout
+
     def send(self, packet):
         if not self._connected:
             raise Exception
         self._received_packets.append(packet)
 
-    def send_for_result(self, packet, buffer_size=BUFFER_SIZE):
+    def send_for_result(self, packet, buffer_size=BUFFER_SIZE, results=None):
         if not self._connected:
             raise Exception
         self._received_packets.append(packet)
 
         try:
-            results = self._expected_results[packet].pop(0)
+            responses = self._expected_results[packet].pop(0)
         except IndexError:
-            results = self._expected_results[None].pop(0)
+            responses = self._expected_results[None].pop(0)
 
-        last_result = results[-1]
+        last_result = responses[-1]
         status = decode_status(struct.unpack("<I", last_result[-4:])[0])
         success = not status.get('is_error', False)
         if not success:
             self.device.wrapper.print("Error: %s" % status)
 
         if len(last_result) > 6:
-            results[-1] = last_result[:-6]
+            responses[-1] = last_result[:-6]
         else:
-            results.pop()
+            responses.pop()
 
+        if results is None:
+            return status, responses
+        for response in responses:
+            results.append(response)
         return status, results
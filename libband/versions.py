@@ -2,6 +2,9 @@ from dataclasses import dataclass
 from enum import IntEnum
 import struct
 
+# app name, pcb id, major, minor, revision, build number, debug build
+FIRMWARE_VERSION = struct.Struct('<5sBHHIIB')
+
 
 class BandType(IntEnum):
     """
@@ -26,13 +29,14 @@ class FirmwareVersion:
     debug_build: int = 0
 
     @staticmethod
-    def deserialize(packet):
+    def deserialize(packet, offset=0):
         version = FirmwareVersion()
-        version.app_name = packet[:5].rstrip(b'\0').decode('utf-8')
         (
-            version.pcb_id, version.version_major, version.version_minor,
-            version.revision, version.build_number, version.debug_build
-        ) = struct.unpack('<BHHIIB', packet[5:19])
+            app_name, version.pcb_id, version.version_major,
+            version.version_minor, version.revision, version.build_number,
+            version.debug_build
+        ) = FIRMWARE_VERSION.unpack_from(packet, offset)
+        version.app_name = app_name.rstrip(b'\0').decode('utf-8')
         return version
 
     def __repr__(self):
@@ -48,6 +52,13 @@ class DeviceVersion:
     application: FirmwareVersion = FirmwareVersion()
     updater: FirmwareVersion = FirmwareVersion()
 
+    @staticmethod
+    def from_dict(data):
+        return DeviceVersion(**{
+            slot: FirmwareVersion(**fw_version)
+            for slot, fw_version in data.items()
+        })
+
     @property
     def band_type(self):
         if self.bootloader.pcb_id >= 20: